@@ -3,12 +3,16 @@
 # -*- coding: utf-8 -*-
 
 import os
-from subprocess import check_output, Popen, PIPE, STDOUT
+import sys
+from shutil import which
+from subprocess import check_output, run, Popen, DEVNULL, PIPE, STDOUT
 import re
 import argparse
 from json import loads
 from json import dump as jdump
 import time
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
 from unicodedata import normalize
 
 try:
@@ -16,6 +20,11 @@ try:
 except ImportError:
     multiprocessing = None
 
+try:
+    import termios
+except ImportError:
+    termios = None
+
 try:
     from setproctitle import setproctitle
 except ImportError:
@@ -30,9 +39,44 @@ except ImportError:
     HAS_TQDM = False
     tqdm = None
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+
+def jloads(buf):
+    """parse JSON, with orjson's C decoder when it's installed"""
+    if HAS_ORJSON:
+        return orjson.loads(buf)
+    return loads(buf)
+
+
+def jdumpf(obj, path, pretty=False):
+    """write JSON to a file, with orjson's C encoder when it's installed"""
+    if HAS_ORJSON:
+        option = orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        with open(path, "wb") as fd:
+            fd.write(orjson.dumps(obj, option=option))
+    else:
+        with open(path, "w") as fd:
+            jdump(obj, fd, sort_keys=True, indent=4 if pretty else None, separators=(",", ": "))
+
 
 args = None
 
+probe_cache_dir = os.path.expanduser("~/.cache/aax2mp3")
+
+_ABRIDGED_RE = re.compile(r"\s*[(](Una|A)bridged[)]")
+_WS_RE = re.compile(r"\s+")
+_SAFE_RE = re.compile(r"[^a-zA-Z0-9._/-]")
+_UNDERSCORE_RE = re.compile(r"_+")
+_CHAPTER_FILE_RE = re.compile(r"(Chapter \d|\d{2} - )")  # mp3splt and ffmpeg chapter filenames
+
 codecs = {  # codec, ext, container
     "mp3": ["libmp3lame", "mp3", "mp3"],
     "aac": ["copy", "m4a", "m4a"],
@@ -42,6 +86,40 @@ codecs = {  # codec, ext, container
     "opus": ["libopus", "opus", "opus"],
 }
 
+encoder_preference = {  # best-first alternatives for each non-copy codec
+    "libmp3lame": ["libmp3lame", "libshine"],
+    # no fallback for libopus: the native opus encoder is experimental and
+    # refuses to run without -strict experimental
+    "libopus": ["libopus"],
+    "flac": ["flac"],
+}
+
+
+def select_encoders():
+    """
+    Probe the available ffmpeg encoders once and point the codecs table at the
+    best one actually present in this build. Runs in main before the worker
+    pool is created, so workers inherit the updated table via fork. The
+    aac/m4a/m4b entries stay on stream copy, which beats any encoder -
+    hardware-accelerated or not - by not encoding at all.
+    """
+    try:
+        buf = check_output(["ffmpeg", "-hide_banner", "-encoders"]).decode("utf-8")
+    except Exception:
+        return
+
+    available = set()
+    for line in buf.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("A"):  # audio encoders only
+            available.add(parts[1])
+
+    for entry in codecs.values():
+        for candidate in encoder_preference.get(entry[0], []):
+            if candidate in available:
+                entry[0] = candidate
+                break
+
 
 def parse_ffmpeg_time(time_str):
     """Parse ffmpeg time string (HH:MM:SS.ms) to seconds"""
@@ -59,6 +137,18 @@ def parse_ffmpeg_time(time_str):
         return 0
 
 
+def _parse_out_time(s):
+    """
+    Fast path for ffmpeg's -progress out_time, which is always
+    HH:MM:SS.microseconds; no split, no list, no float of the whole string.
+    Falls back to the general parser on anything malformed.
+    """
+    try:
+        return int(s[0:2]) * 3600 + int(s[3:5]) * 60 + int(s[6:8]) + int(s[9:15]) * 1e-6
+    except (ValueError, IndexError):
+        return parse_ffmpeg_time(s)
+
+
 def run_ffmpeg_with_progress(cmd, total_duration, description="Processing", show_progress=True):
     """
     Run ffmpeg command with progress bar.
@@ -74,49 +164,54 @@ def run_ffmpeg_with_progress(cmd, total_duration, description="Processing", show
     """
     if not show_progress or not HAS_TQDM or total_duration <= 0:
         # Fall back to simple execution
-        cmd_str = " ".join([f'"{arg}"' if " " in str(arg) else str(arg) for arg in cmd])
-        return os.system(cmd_str.encode("utf-8"))
-
-    # Add progress output to ffmpeg command
-    # Insert -progress pipe:1 after ffmpeg
-    progress_cmd = cmd.copy()
-    # Find where to insert progress args (after 'ffmpeg')
-    if progress_cmd[0] == "ffmpeg":
-        progress_cmd.insert(1, "-progress")
-        progress_cmd.insert(2, "pipe:1")
-        # Change loglevel to quiet to avoid mixing output
-        for i, arg in enumerate(progress_cmd):
-            if arg == "-loglevel":
-                progress_cmd[i + 1] = "quiet"
-                break
+        return run(cmd, stdin=DEVNULL).returncode
+
+    # Ask ffmpeg to report progress on stdout; -nostats keeps the usual
+    # carriage-return stats line out of the stream we parse. It only holds if
+    # the caller's argv doesn't re-enable it: a later -stats wins and prints
+    # even at -loglevel quiet, so callers must drop -stats along with passing
+    # -loglevel quiet when they want the bar. No argv rewriting here.
+    progress_cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
 
     try:
-        process = Popen(progress_cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+        # stdin=DEVNULL like the fallback paths: an interactive ffmpeg prompt
+        # then fails fast instead of blocking invisibly behind the bar
+        process = Popen(progress_cmd, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT, bufsize=0)
+        fd = process.stdout.fileno()
 
         with tqdm(total=100, desc=description, unit="%", ncols=80,
                   bar_format='{desc}: {percentage:3.0f}%|{bar}| [{elapsed}<{remaining}]') as pbar:
             current_progress = 0
+            buf = b""
 
-            for line in process.stdout:
-                line = line.strip()
-                if line.startswith("out_time="):
-                    time_str = line.split("=")[1]
-                    current_time = parse_ffmpeg_time(time_str)
-                    new_progress = min(int((current_time / total_duration) * 100), 100)
-                    if new_progress > current_progress:
-                        pbar.update(new_progress - current_progress)
-                        current_progress = new_progress
-                elif line == "progress=end":
+            # Read raw chunks and scan for the two keys we care about, rather
+            # than decoding and splitting every key=value line ffmpeg emits
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                buf += chunk
+                if b"progress=end" in buf:
                     pbar.update(100 - current_progress)
                     break
+                # Only the newest out_time matters, so scan backwards for it
+                i = buf.rfind(b"out_time=")
+                if i >= 0:
+                    j = buf.find(b"\n", i)
+                    if j >= 0:
+                        current_time = _parse_out_time(buf[i + 9:j].decode("ascii", "ignore").strip())
+                        new_progress = min(int((current_time / total_duration) * 100), 100)
+                        if new_progress > current_progress:
+                            pbar.update(new_progress - current_progress)
+                            current_progress = new_progress
+                        buf = buf[j + 1:]
 
             process.wait()
 
         return process.returncode
-    except Exception as e:
+    except Exception:
         # Fall back to simple execution on error
-        cmd_str = " ".join([f'"{arg}"' if " " in str(arg) else str(arg) for arg in cmd])
-        return os.system(cmd_str.encode("utf-8"))
+        return run(cmd, stdin=DEVNULL).returncode
 
 
 def check_missing_authcode(args):
@@ -139,6 +234,16 @@ def check_missing_authcode(args):
     return True
 
 
+_program_cache = {}
+
+
+def have_program(p):
+    """PATH lookup without forking `which`, memoized so pool workers don't re-walk PATH"""
+    if p not in _program_cache:
+        _program_cache[p] = which(p) is not None
+    return _program_cache[p]
+
+
 def missing_required_programs(args):
     """ensure that various dependencies are available"""
     error = False
@@ -149,30 +254,20 @@ def missing_required_programs(args):
         required.append("mp3splt")
 
     for p in required:
-        try:
-            check_output(["which", p])
-        except Exception:
+        if not have_program(p):
             error = True
             print(f"missing dependency - {p}")
     return error
 
 
-def numfix(n):
-    """convert the number of seconds into the format that mp3splt prefers"""
-    n = float(n)
-    m = int(n / 60)
-    s = n - (m * 60)
-    return f"{m}.{s:.2f}"
-
-
 def get_splitpoints(container, md):
     """figure out where mp3splt should split the file"""
     splitpoints = [float(x["start_time"]) for x in md["chapters"]]
     if container == "mp3":
-        splitpoints.append(
-            md["chapters"][-1]["end_time"]
-        )  # mp3splt needs to know the end of the split. it can't assume EOF
-        splitpoints = [numfix(x) for x in splitpoints]
+        # mp3splt needs to know the end of the split. it can't assume EOF
+        splitpoints.append(float(md["chapters"][-1]["end_time"]))
+        # and it wants its splitpoints as minutes.seconds
+        splitpoints = [f"{int(n // 60)}.{n % 60:.2f}" for n in splitpoints]
 
     return splitpoints
 
@@ -185,6 +280,20 @@ def probe_metadata(args, fn):
     if not os.path.exists(fn):
         print("Derp! Input file does not exist!")
         return None
+
+    # ffprobe with -activation_bytes decrypts the AAX header every time, so
+    # cache the parsed result on disk, keyed on mtime/size. Resume runs over
+    # a big library then skip the probe entirely.
+    cache_key = f"{os.path.getmtime(fn)}:{os.path.getsize(fn)}"
+    cache_file = os.path.join(probe_cache_dir, sha1(os.path.abspath(fn).encode("utf-8")).hexdigest() + ".json")
+    try:
+        with open(cache_file, "rb") as fd:
+            cached = jloads(fd.read())
+        if cached.get("key") == cache_key:
+            return cached["metadata"]
+    except (OSError, ValueError):
+        pass
+
     cmd = [
         "ffprobe",
         "-v",
@@ -202,81 +311,180 @@ def probe_metadata(args, fn):
 
     buf = check_output(cmd).decode("utf-8")
 
-    buf = re.sub(r"\s*[(](Una|A)bridged[)]", "", buf)  # I don't care about abridged or not
-    buf = re.sub(r"\s+", " ", buf)  # squish all whitespace runs
+    buf = _ABRIDGED_RE.sub("", buf)  # I don't care about abridged or not
+    buf = _WS_RE.sub(" ", buf)  # squish all whitespace runs
+
+    ffprobe = jloads(buf)
+
+    try:
+        os.makedirs(probe_cache_dir, exist_ok=True)
+        tmpfile = f"{cache_file}.{os.getpid()}.tmp"
+        jdumpf({"key": cache_key, "metadata": ffprobe}, tmpfile)
+        os.replace(tmpfile, cache_file)  # atomic, safe with a pool of workers
+    except OSError:
+        pass
 
-    ffprobe = loads(buf)
     return ffprobe
 
 
-def split_with_ffmpeg(args, destdir, src, md, cover_file=None):
-    """Split non-MP3 files using ffmpeg"""
+def encoder_threads(args):
+    """
+    Let the encoder use all cores, but when running a pool of transcoders
+    divide the cores between them to avoid oversubscription
+    """
+    if args.processes > 1:
+        return str(max(1, (os.cpu_count() or 1) // args.processes))
+    return "0"
+
+
+def _run_quiet(cmd):
+    """run a command without any terminal interaction"""
+    return run(cmd, stdin=DEVNULL).returncode
+
+
+def split_with_ffmpeg(args, destdir, src, md, cover_file=None, direct=False):
+    """
+    Split non-MP3 files using ffmpeg. With direct=True, src is the caller's
+    original (still encrypted) input rather than a disposable intermediate
+    written by convert_file, so it gets decrypted/encoded here and is never
+    deleted.
+    """
     chapters = md["chapters"]
+    if not chapters:
+        # a chapterless book still gets one output file from the tagging pass
+        chapters = [{"tags": {}}]
     t = md["format"]["tags"]
     ext = codecs[args.container][1]
-    codec = codecs[args.container][0]
     num_chapters = len(chapters)
 
     if args.verbose:
         print(f"Splitting {src} into {num_chapters} chapters using ffmpeg")
 
-    # Use tqdm for chapter progress if available and not in verbose mode
-    use_chapter_progress = HAS_TQDM and not args.verbose and not args.test
-    chapter_iter = chapters
-    if use_chapter_progress:
-        chapter_iter = tqdm(chapters, desc="Splitting chapters", unit="ch", ncols=80)
+    # Cut all chapters in one pass with the segment muxer, so the source is
+    # read and demuxed exactly once instead of once per chapter. When handed
+    # the original input directly, decrypt and encode straight into the muxer
+    # so no multi-GB intermediate is ever written or read back; otherwise src
+    # is an already-transcoded intermediate and the segments can be
+    # stream-copied.
+    show_progress = HAS_TQDM and not args.verbose
+    loglevel = "quiet" if (direct and show_progress) else "error"
+    input_args = []
+    codec_args = ["-c:a", "copy"]
+    if direct:
+        threads = encoder_threads(args)
+        input_args = ["-activation_bytes", args.auth, "-threads", threads]
+        codec = codecs[args.container][0]
+        if codec == "copy":
+            # The AAC bitstream in the AAX is already what we want; decrypting
+            # is the only real work, so cut by stream copy
+            codec_args = ["-c:a", "copy"]
+        else:
+            ac = "2"
+            ab = md["format"]["bit_rate"]
+            if args.mono:
+                ac = "1"
+                ab = str(int(ab) / 2)
+            codec_args = ["-c:a", codec, "-threads:a", threads, "-ab", ab, "-ac", ac]
+            if args.container == "flac":
+                codec_args.extend(["-compression_level", "5"])
+
+    # -y: segment-NN files are our own scratch output and can be left behind
+    # by an interrupted run; overwrite them rather than hitting ffmpeg's
+    # interactive overwrite prompt on a re-run
+    segment_cmd = [
+        "ffmpeg",
+        "-loglevel", loglevel,
+        "-y",
+        *input_args,
+        "-i", src,
+        "-map", "0:a",
+        *codec_args,
+    ]
+    if num_chapters < 2:
+        # The segment muxer rejects an empty -segment_times, and with a
+        # single chapter there is nothing to cut anyway
+        segment_cmd.append(os.path.join(destdir, f"segment-00.{ext}"))
+    else:
+        segment_times = ",".join(str(chapter["end_time"]) for chapter in chapters[:-1])
+        segment_cmd.extend([
+            "-f", "segment",
+            "-segment_times", segment_times,
+            "-reset_timestamps", "1",
+        ])
+        if codec_args[1] == "copy":
+            # Stream-copied cuts can start mid-packet; clamp the timestamps
+            segment_cmd.extend(["-avoid_negative_ts", "make_zero"])
+        segment_cmd.append(os.path.join(destdir, f"segment-%02d.{ext}"))
+    if direct and cover_file and not os.path.exists(cover_file):
+        # Second output: pull the embedded cover out of the same decrypt pass
+        # instead of opening and decrypting the AAX again
+        segment_cmd.extend(["-map", "0:v?", "-c:v", "copy", cover_file])
+
+    if args.verbose or args.test:
+        print(" ".join(segment_cmd))
+
+    success = True
+    if not args.test:
+        if direct:
+            total_duration = float(md["format"].get("duration", 0))
+            title = t.get("title", "audio")
+            rv = run_ffmpeg_with_progress(segment_cmd, total_duration, f"Transcoding {title}", show_progress)
+        else:
+            rv = run(segment_cmd, stdin=DEVNULL).returncode
+        if rv != 0:
+            print(f"Error segmenting {src}")
+            success = False
 
     # Check if we can embed cover art (supported in m4a/m4b/mp3, not in flac/opus via this method)
     embed_cover = cover_file and os.path.exists(cover_file) and args.container in ["m4a", "m4b", "aac"]
 
-    success = True
-    for i, chapter in enumerate(chapter_iter):
+    # Second pass: rename each segment to its chapter title and attach
+    # metadata/cover art. This is mux-only (-c copy), so it's cheap. The
+    # chapters are independent, so build all the commands first and run them
+    # through a worker pool.
+
+    # Everything that doesn't vary by chapter is built once outside the loop
+    cover_args = []
+    if embed_cover:
+        # cover art as second input, mapped alongside the audio
+        cover_args = [
+            "-i", cover_file,
+            "-map", "0:a",
+            "-map", "1:v",
+            "-c:v", "copy",
+            "-disposition:v:0", "attached_pic",
+        ]
+
+    static_meta = [
+        "-metadata", f'artist={t.get("artist", "")}',
+        "-metadata", f'album={t.get("title", "")}',
+        "-metadata", f'album_artist={t.get("album_artist", "")}',
+        "-metadata", f'date={t.get("date", "")}',
+        "-metadata", f'genre={t.get("genre", "")}',
+    ]
+
+    jobs = []  # (chapter_num, cmd, segment_file)
+    for i, chapter in enumerate(chapters):
         chapter_num = i + 1
         chapter_title = chapter["tags"].get("title", f"Chapter {chapter_num}")
-        start_time = float(chapter["start_time"])
-        end_time = float(chapter["end_time"])
-        duration = end_time - start_time
 
         # Sanitize chapter title for filename (replace underscores with spaces for readability)
         safe_title = sanitize(chapter_title).replace("_", " ")
+        segment_file = os.path.join(destdir, f"segment-{i:02d}.{ext}")
         output_file = os.path.join(destdir, f"{chapter_num:02d} - {safe_title}.{ext}")
 
-        # Build ffmpeg command
-        # Note: -ss and -t must come BEFORE -i to apply as input options (faster seeking)
-        # and to avoid affecting the cover image input
         cmd = [
             "ffmpeg",
             "-loglevel", "error",
-            "-ss", str(start_time),
-            "-t", str(duration),
-            "-i", src,
-        ]
-
-        # Add cover art input if available (no seek options for cover)
-        if embed_cover:
-            cmd.extend(["-i", cover_file])
-
-        # Map streams: audio from first input, cover from second if available
-        if embed_cover:
-            cmd.extend([
-                "-map", "0:a",
-                "-map", "1:v",
-                "-c:v", "copy",
-                "-disposition:v:0", "attached_pic",
-            ])
-
-        cmd.extend([
-            "-c:a", codec,
+            "-i", segment_file,
+            *cover_args,
+            "-c:a", "copy",
             "-map_metadata", "-1",  # Clear existing metadata
             "-metadata", f'title={chapter_title}',
-            "-metadata", f'artist={t.get("artist", "")}',
-            "-metadata", f'album={t.get("title", "")}',
-            "-metadata", f'album_artist={t.get("album_artist", "")}',
-            "-metadata", f'date={t.get("date", "")}',
-            "-metadata", f'genre={t.get("genre", "")}',
+            *static_meta,
             "-metadata", f'track={chapter_num}/{num_chapters}',
-            output_file
-        ])
+            output_file,
+        ]
 
         if args.verbose or args.test:
             print(f"Chapter {chapter_num}: {chapter_title}")
@@ -284,27 +492,44 @@ def split_with_ffmpeg(args, destdir, src, md, cover_file=None):
             if args.test:
                 continue
 
-        # Run ffmpeg quietly when using progress bar
-        cmd_str = " ".join([f'"{arg}"' if " " in str(arg) else str(arg) for arg in cmd])
-        rv = os.system(cmd_str.encode("utf-8"))
-        if rv != 0:
-            print(f"Error splitting chapter {chapter_num}")
-            success = False
+        jobs.append((chapter_num, cmd, segment_file))
 
-    if success and not args.test and not args.keep:
-        os.unlink(src)
-    elif success and args.keep and args.verbose:
-        print(f"Keeping intermediate file: {src}")
+    if success and jobs:
+        if args.verbose:
+            # Keep execution serial in verbose mode so output stays readable
+            results = [_run_quiet(cmd) for _, cmd, _ in jobs]
+        else:
+            # Threads, not processes: the jobs are just subprocess waits, and
+            # threads also work inside the daemonic file-pool workers, which
+            # are not allowed to spawn child processes
+            workers = args.processes if args.processes > 1 else (os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                results = pool.map(_run_quiet, [cmd for _, cmd, _ in jobs])
+                if HAS_TQDM:
+                    results = tqdm(results, total=len(jobs), desc="Tagging chapters", unit="ch", ncols=80)
+                results = list(results)
+
+        for (chapter_num, _, segment_file), rv in zip(jobs, results):
+            if rv != 0:
+                print(f"Error tagging chapter {chapter_num}")
+                success = False
+            else:
+                os.unlink(segment_file)
+
+    if success and not args.test and not direct:
+        if not args.keep:
+            os.unlink(src)
+        elif args.verbose:
+            print(f"Keeping intermediate file: {src}")
 
 
-def split_file(args, destdir, src, md, cover_file=None):
-    """Split the file into chapters"""
+def split_file(args, destdir, src, md, cover_file=None, direct=False):
+    """Split the file into chapters; direct=True means src is the original input"""
     splitpoints = get_splitpoints(args.container, md)
     t = md["format"]["tags"]
     if args.container == "mp3":
-        # Escape special characters in metadata for mp3splt
-        artist = t.get("artist", "Unknown").replace('"', '\\"')
-        title = t.get("title", "Unknown").replace('"', '\\"')
+        artist = t.get("artist", "Unknown")
+        title = t.get("title", "Unknown")
         date = t.get("date", "")
 
         cmd = [
@@ -312,27 +537,26 @@ def split_file(args, destdir, src, md, cover_file=None):
             "-T",
             "12",
             "-o",
-            '"Chapter @n"',
+            "Chapter @n",
             "-g",
-            f'"r%[@N=1,@a={artist},@b={title},@y={date},@t=Chapter @n,@g=183]"',
+            f"r%[@N=1,@a={artist},@b={title},@y={date},@t=Chapter @n,@g=183]",
             "-d",
-            f'"{destdir}"',
-            f'"{src}"',
-            " ".join(splitpoints),
+            destdir,
+            src,
+            *splitpoints,
         ]
         if args.verbose or args.test:
             print(cmd)
             if args.test:
                 return
-        cmd = " ".join(cmd)
-        rv = os.system(cmd.encode("utf-8"))
+        rv = run(cmd, stdin=DEVNULL).returncode
         if rv == 0 and not args.keep:
             os.unlink(src)
         elif rv == 0 and args.keep and args.verbose:
             print(f"Keeping intermediate file: {src}")
     else:
         # Use ffmpeg for non-MP3 formats (AAC, M4A, M4B, FLAC, Opus)
-        split_with_ffmpeg(args, destdir, src, md, cover_file)
+        split_with_ffmpeg(args, destdir, src, md, cover_file, direct)
 
 
 def extract_image(args, destdir, fn):
@@ -367,8 +591,8 @@ def sanitize(s):
     s = normalize("NFKD", s)
     s = s.encode("ascii", "ignore").decode("ascii", "ignore")
     s = s.replace("'", "").replace('"', "")
-    s = re.sub("[^a-zA-Z0-9._/-]", "_", s)
-    s = re.sub("_+", "_", s)
+    s = _SAFE_RE.sub("_", s)
+    s = _UNDERSCORE_RE.sub("_", s)
     return s
 
 
@@ -383,35 +607,53 @@ def convert_file(args, fn, md):
         return
     destdir = sanitize(destdir)
 
-    if not os.path.exists(destdir):
+    # One scandir instead of separate exists/listdir/exists stats below
+    try:
+        entries = {e.name for e in os.scandir(destdir)}
+    except FileNotFoundError:
         os.makedirs(destdir)
+        entries = set()
 
     # XXX figure out how to hook up decrypt-only, eg:
     # XXX ffmpeg -activation_bytes $AUTHCODE -i input.aax -c:a copy -vn -f mp4 output.mp4
-    with open(f"{destdir}/metadata.json", "w") as fd:
-        jdump(md, fd, sort_keys=True, indent=4, separators=(",", ": "))
+    jdumpf(md, f"{destdir}/metadata.json", pretty=True)
 
     if args.metadata:
         return
 
-    # Extract cover image (will be embedded in chapter files if supported)
+    # The cover comes out of the same decrypt pass as the audio further down;
+    # only the cover-only path still runs a separate extraction
     cover_file = os.path.join(destdir, "cover.jpg")
-    try:
-        extract_image(args, destdir, fn)
-    except Exception:
-        cover_file = None
-
     if args.coverimage:
+        try:
+            extract_image(args, destdir, fn)
+        except Exception:
+            pass
         return
 
-    if "Chapter " in str(os.listdir(destdir)):
+    if any(_CHAPTER_FILE_RE.match(n) for n in entries):
         if args.verbose:
             print(f"Already processed {fn}")
         return
 
+    # Clear a stale cover before dispatching: both decrypt paths only add the
+    # cover output when the file is absent
+    if args.overwrite and os.path.exists(cover_file):
+        os.unlink(cover_file)
+
+    if not args.single and not args.keep and args.container != "mp3":
+        # Decrypt/encode straight into the chapter splitter, skipping the
+        # write and read-back of a multi-GB intermediate file. -k promises to
+        # keep that intermediate, so it takes the two-stage path below.
+        t = time.time()
+        split_file(args, destdir, fn, md, cover_file, direct=True)
+        if args.verbose:
+            print(f"transcoding time: {time.time() - t:0.2f}s")
+        return
+
     destfn = fn.replace(".aax", f".{codecs[args.container][1]}")
     output = os.path.join(destdir, destfn)
-    if os.path.exists(output) and args.overwrite:
+    if os.path.basename(output) in entries and args.overwrite:
         print(f"removing transcoded file: {output}")
         os.unlink(output)
 
@@ -443,26 +685,41 @@ def convert_file(args, fn, md):
 
     metadata_args.extend(["-metadata", "track=1/1"])
 
+    threads = encoder_threads(args)
+    codec = codecs[args.container][0]
+    if codec == "copy":
+        # No re-encode: -ab/-ac would be ignored, and faststart moves the
+        # moov atom up front so players can start without a full read
+        codec_args = ["-codec:a", "copy", "-movflags", "+faststart"]
+    else:
+        codec_args = ["-codec:a", codec, "-threads:a", threads, "-ab", ab, "-ac", ac]
+        if args.container == "flac":
+            codec_args.extend(["-compression_level", "5"])
+
+    # Use progress bar for transcoding (especially useful for FLAC/Opus encoding)
+    show_progress = HAS_TQDM and not args.verbose
+
     cmd = [
         "ffmpeg",
         "-loglevel",
-        "error",
-        "-stats",
+        "quiet" if show_progress else "error",
+    ] + ([] if show_progress else ["-stats"]) + [
         "-activation_bytes",
         args.auth,
         "-n",
+        "-threads",
+        threads,
         "-i",
         fn,
         "-vn",
-        "-codec:a",
-        codecs[args.container][0],
-        "-ab",
-        ab,
-        "-ac",
-        ac,
+    ] + codec_args + [
         "-map_metadata",
         "-1",
     ] + metadata_args + [output]
+
+    if not os.path.exists(cover_file):
+        # Second output: pull the embedded cover out of the same decrypt pass
+        cmd.extend(["-map", "0:v?", "-c:v", "copy", cover_file])
     if args.test or args.verbose:
         print(" ".join([f'"{arg}"' if " " in str(arg) else str(arg) for arg in cmd]))
         print("splitpoints:", get_splitpoints(args.container, md))
@@ -474,8 +731,6 @@ def convert_file(args, fn, md):
     total_duration = float(md["format"].get("duration", 0))
     title = md["format"]["tags"].get("title", "audio")
 
-    # Use progress bar for transcoding (especially useful for FLAC/Opus encoding)
-    show_progress = HAS_TQDM and not args.verbose
     run_ffmpeg_with_progress(cmd, total_duration, f"Transcoding {title}", show_progress)
 
     t = time.time() - t
@@ -487,8 +742,14 @@ def convert_file(args, fn, md):
     split_file(args, destdir, output, md, cover_file)
 
 
-def process_wrapper(fn):
+def _init_worker(a):
+    """pool initializer: hand the parsed args to each worker exactly once"""
     global args
+    args = a
+    setproctitle("transcode_worker")
+
+
+def process_wrapper(fn):
     setproctitle(f"transcode {fn}")
     md = None
     try:
@@ -560,6 +821,8 @@ def main():
     if something_is_wrong:
         exit(1)
 
+    select_encoders()
+
     if args.mono:
         args.outdir += "-mono"
 
@@ -570,11 +833,27 @@ def main():
         for fn in args.input:
             process_wrapper(fn)
     else:
-        proc_pool = multiprocessing.Pool(processes=args.processes, maxtasksperchild=1)
+        # Longest-first scheduling: start the big books first, and let a free
+        # worker immediately pick up the next file rather than map()'s
+        # round-robin assignment leaving workers idle at the tail
+        inputs = sorted(args.input, key=lambda f: os.path.getsize(f) if os.path.exists(f) else 0, reverse=True)
+        proc_pool = multiprocessing.Pool(processes=args.processes, initializer=_init_worker, initargs=(args,))
         setproctitle("transcode_dispatcher")
-        proc_pool.map(process_wrapper, args.input, chunksize=1)
-
-    os.system("stty echo")
+        results = proc_pool.imap_unordered(process_wrapper, inputs, chunksize=1)
+        if HAS_TQDM:
+            results = tqdm(results, total=len(inputs), desc="Files", unit="file", ncols=80)
+        for _ in results:
+            pass
+
+    # ffmpeg sometimes leaves the terminal with echo disabled; restore it
+    # in-process instead of forking `stty`
+    if termios and sys.stdin.isatty():
+        try:
+            attrs = termios.tcgetattr(sys.stdin.fileno())
+            attrs[3] |= termios.ECHO
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSANOW, attrs)
+        except Exception:
+            pass
 
 
 if __name__ == "__main__":